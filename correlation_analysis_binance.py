@@ -0,0 +1,266 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+from drawdown_analysis_binance import exclude_symbols, exclude_names
+
+# --- 配置区域 ---
+interval = '1h'
+interval_ms = 60 * 60 * 1000
+periods_per_year = 24 * 365          # 小时线年化系数
+lookback_days = 30
+window_bars = lookback_days * 24     # 相关性 / Beta 的统计窗口 (根数)
+min_periods = 24 * 7                 # 两个币种共同样本不足 7 天则不给结果
+vol_windows = {'24h': 24, '7d': 24 * 7}
+benchmarks = ['BTCUSDT', 'ETHUSDT']
+
+base_url = "https://api.binance.com/api/v3/klines"
+close_cache_file = 'data/binance_close_{}.pkl'.format(interval)
+moments_cache_file = 'data/binance_return_moments_{}.pkl'.format(interval)
+
+
+def load_universe(input_file='data/top_250_coingecko.csv'):
+    """读取市值列表，按与回撤分析相同的规则过滤，返回 Binance 交易对列表"""
+    df = pd.read_csv(input_file)
+    mask = ~df['symbol'].str.lower().isin(exclude_symbols) & ~df['name'].isin(exclude_names)
+    symbols = [f"{s.upper()}USDT" for s in df.loc[mask, 'symbol']]
+    # 基准币种必须在矩阵里
+    for b in benchmarks:
+        if b not in symbols:
+            symbols.insert(0, b)
+    return list(dict.fromkeys(symbols))
+
+
+def fetch_closed_klines(symbol, start_ts, end_ts):
+    """分页拉取 [start_ts, end_ts) 内已收盘的 K 线，返回 {开盘时间: 收盘价}"""
+    closes = {}
+    while start_ts < end_ts:
+        params = {
+            'symbol': symbol,
+            'interval': interval,
+            'startTime': start_ts,
+            'endTime': end_ts,
+            'limit': 1000
+        }
+        response = requests.get(base_url, params=params, timeout=5)
+        if response.status_code != 200:
+            break
+        klines = response.json()
+        if not klines:
+            break
+        for k in klines:
+            # k[6] 是收盘时间，未收盘的 K 线不入库，避免缓存半根 bar
+            if k[6] < end_ts:
+                closes[k[0]] = float(k[4])
+        if len(klines) < 1000:
+            break
+        start_ts = klines[-1][0] + interval_ms
+        time.sleep(0.15)
+    return closes
+
+
+def update_close_cache(symbols):
+    """
+    增量更新收盘价矩阵 (行: 开盘时间, 列: 交易对)。
+    每个交易对只请求缓存中最后一根之后的 K 线。
+    返回 (closes, earliest_new_ts)，earliest_new_ts 是本次新写入的最早时间戳。
+    """
+    if os.path.exists(close_cache_file):
+        closes = pd.read_pickle(close_cache_file)
+    else:
+        closes = pd.DataFrame(dtype=float)
+
+    end_ts = int(time.time() * 1000)
+    first_ts = (end_ts // interval_ms - window_bars - 1) * interval_ms
+
+    new_data = {}
+    for symbol in symbols:
+        last_ts = closes[symbol].last_valid_index() if symbol in closes.columns else None
+        start_ts = int(last_ts) + interval_ms if last_ts is not None else first_ts
+        # 下一根还没收盘，无需请求
+        if start_ts + interval_ms > end_ts:
+            continue
+        try:
+            klines = fetch_closed_klines(symbol, start_ts, end_ts)
+        except Exception as e:
+            print(f"[{symbol}] 出错: {e}")
+            continue
+        if klines:
+            new_data[symbol] = pd.Series(klines, dtype=float)
+        time.sleep(0.15)
+
+    earliest_new_ts = None
+    if new_data:
+        update = pd.DataFrame(new_data)
+        earliest_new_ts = int(update.index.min())
+        closes = closes.combine_first(update)
+        print(f"新增 K 线: {len(new_data)} 个交易对，最早 {pd.to_datetime(earliest_new_ts, unit='ms')}")
+
+    closes = closes.sort_index()
+    closes = closes[[s for s in symbols if s in closes.columns]]
+    # 多保留一个窗口的历史，供滑动窗口增量更新时扣除移出窗口的样本
+    closes = closes.iloc[-(2 * window_bars + 1):]
+    closes.to_pickle(close_cache_file)
+    return closes, earliest_new_ts
+
+
+def compute_log_returns(closes):
+    """对数收益率矩阵，缺失的 K 线保持为 NaN"""
+    return np.log(closes).diff()
+
+
+def compute_moments(returns):
+    """
+    计算成对统计所需的充分统计量 (全部为 N x N 矩阵乘法)：
+    n[i,j]   两列共同有效的样本数
+    sx[i,j]  共同样本上 x_i 之和
+    sxx[i,j] 共同样本上 x_i^2 之和
+    sxy[i,j] 共同样本上 x_i * x_j 之和
+    可加性：窗口滑动时加上新行、减去移出的行即可。
+    """
+    x = returns.to_numpy(dtype=float)
+    mask = np.isfinite(x)
+    x = np.where(mask, x, 0.0)
+    m = mask.astype(float)
+    return {
+        'n': m.T @ m,
+        'sx': x.T @ m,
+        'sxx': (x * x).T @ m,
+        'sxy': x.T @ x,
+    }
+
+
+def update_moments(returns, earliest_new_ts):
+    """读取缓存的统计量并按滑动窗口增量更新，无法增量时全量重算"""
+    window = returns.iloc[-window_bars:]
+    start_ts, end_ts = int(window.index[0]), int(window.index[-1])
+    columns = list(returns.columns)
+
+    cached = pd.read_pickle(moments_cache_file) if os.path.exists(moments_cache_file) else None
+
+    full_rebuild = (
+        cached is None
+        or cached['columns'] != columns
+        # 旧窗口里的 K 线被补齐过，缓存的统计量已失效
+        or (earliest_new_ts is not None and earliest_new_ts <= cached['end_ts'])
+        # 需要扣除的行已不在收盘价缓存里 (第一行的收益率为 NaN 也算)
+        or cached['start_ts'] <= int(returns.index[0])
+        or cached['end_ts'] > end_ts
+    )
+
+    if not full_rebuild:
+        added = returns[(returns.index > cached['end_ts']) & (returns.index <= end_ts)]
+        dropped = returns[(returns.index >= cached['start_ts']) & (returns.index < start_ts)]
+        # 变动行数超过窗口本身时，直接重算更快
+        full_rebuild = len(added) + len(dropped) >= len(window)
+
+    if full_rebuild:
+        moments = compute_moments(window)
+        print(f"统计量全量计算: {len(window)} 根 x {len(columns)} 个交易对")
+    elif len(added) == 0 and len(dropped) == 0:
+        moments = cached['moments']
+        print("没有新的 K 线，沿用缓存的统计量")
+    else:
+        add_m = compute_moments(added)
+        drop_m = compute_moments(dropped)
+        moments = {k: cached['moments'][k] + add_m[k] - drop_m[k] for k in add_m}
+        print(f"统计量增量更新: +{len(added)} / -{len(dropped)} 根")
+
+    pd.to_pickle({
+        'columns': columns,
+        'start_ts': start_ts,
+        'end_ts': end_ts,
+        'moments': moments,
+    }, moments_cache_file)
+    return moments
+
+
+def moments_to_stats(moments, columns):
+    """由充分统计量得到协方差、相关系数矩阵以及对每个基准的 Beta"""
+    n, sx, sxx, sxy = moments['n'], moments['sx'], moments['sxx'], moments['sxy']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = (sxy - sx * sx.T / n) / (n - 1)
+        # var_pair[i,j]: x_i 在与 x_j 共同样本上的方差
+        var_pair = (sxx - sx * sx / n) / (n - 1)
+        corr = cov / np.sqrt(var_pair * var_pair.T)
+    invalid = n < min_periods
+    cov[invalid] = np.nan
+    corr[invalid] = np.nan
+    var_pair[invalid] = np.nan
+
+    corr_df = pd.DataFrame(corr, index=columns, columns=columns)
+    betas = {}
+    for b in benchmarks:
+        if b not in columns:
+            continue
+        j = columns.index(b)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            betas[b] = pd.Series(cov[:, j] / var_pair[j, :], index=columns)
+    return corr_df, betas
+
+
+def rolling_volatility(returns, window):
+    """滚动年化波动率 (%)，pandas 的 rolling 对所有列一次性向量化计算"""
+    return returns.rolling(window, min_periods=window // 2).std() * np.sqrt(periods_per_year) * 100
+
+
+def run_correlation_analysis():
+    try:
+        symbols = load_universe()
+    except FileNotFoundError:
+        print("未找到 data/top_250_coingecko.csv，请先运行第一步获取列表的代码。")
+        return
+    print(f"分析范围: {len(symbols)} 个交易对，{interval} K 线，窗口 {lookback_days} 天")
+    print("-" * 70)
+
+    closes, earliest_new_ts = update_close_cache(symbols)
+    if len(closes) < 2:
+        print("未获取到数据。")
+        return
+
+    t0 = time.time()
+    returns = compute_log_returns(closes)
+    columns = list(returns.columns)
+    moments = update_moments(returns, earliest_new_ts)
+    corr_df, betas = moments_to_stats(moments, columns)
+
+    recent = returns.iloc[-window_bars:]
+    summary = pd.DataFrame(index=columns)
+    summary.index.name = '交易对'
+    for b, beta in betas.items():
+        name = b.replace('USDT', '')
+        summary[f'对{name} Beta'] = beta.round(3)
+        summary[f'对{name}相关性'] = corr_df[b].round(3)
+    for label, w in vol_windows.items():
+        vol = rolling_volatility(recent, w)
+        vol.round(2).to_csv(f'output/binance_rolling_vol_{label}_{interval}.csv', encoding='utf-8-sig')
+        summary[f'{label}年化波动率(%)'] = vol.iloc[-1].round(2)
+    summary['有效样本数'] = np.diag(moments['n']).astype(int)
+    print(f"矩阵计算耗时: {time.time() - t0:.2f}s")
+
+    sort_col = '对BTC Beta' if 'BTCUSDT' in betas else summary.columns[0]
+    summary = summary.sort_values(by=sort_col, ascending=False)
+
+    last_bar = pd.to_datetime(int(closes.index[-1]), unit='ms').strftime('%Y-%m-%d %H:%M')
+    corr_file = f'output/binance_correlation_matrix_{interval}.csv'
+    summary_file = f'output/binance_beta_volatility_{interval}.csv'
+    corr_df.round(4).to_csv(corr_file, encoding='utf-8-sig')
+    summary.to_csv(summary_file, encoding='utf-8-sig')
+
+    print("-" * 70)
+    print(f"分析完成！最新 K 线: {last_bar} (UTC)")
+    print(f"相关性矩阵已保存至: {corr_file}")
+    print(f"Beta / 波动率已保存至: {summary_file}")
+
+    if 'BTCUSDT' in betas:
+        print("\n" + "=" * 40)
+        print("【对 BTC Beta 最高的 10 个交易对】")
+        print(summary[[sort_col, '对BTC相关性']].drop(index='BTCUSDT', errors='ignore').head(10).to_string())
+        print("=" * 40 + "\n")
+
+
+if __name__ == "__main__":
+    run_correlation_analysis()
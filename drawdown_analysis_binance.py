@@ -6,10 +6,7 @@ import time
 # 获取当前日期和100天前日期
 today = datetime.now().strftime("%Y-%m-%d")
 start_date_str = (datetime.now() - timedelta(days=100)).strftime("%Y-%m-%d")
-print(f"开始日期: {start_date_str}")
-print(f"结束日期: {today}")
 target_date_str = "2025-11-30"  # 设定的目标日期
-print(f"目标日期: {target_date_str}")
 exclude_symbols=[
                 'usdt', 'usdc', 'fdusd', 'dai', 'busd','tusd',
                 'usde', 'usd1','susds','pyusd','usds','usde','syrupusdt',
@@ -18,10 +15,15 @@ exclude_symbols=[
                 'wbtc', 'cbbtc','fbtc',
                 'jitosol','bnsol',
                 'wbnb',
+                'usdp', 'eur', 'aeur',
                     ]
 exclude_names = ['Wrapped SOL']
 
 def fetch_binance_drawdown_analysis():
+    print(f"开始日期: {start_date_str}")
+    print(f"结束日期: {today}")
+    print(f"目标日期: {target_date_str}")
+
     # 1. 读取第一步生成的 CSV (包含市值信息)
     input_file = 'data/top_250_coingecko.csv'
     try:
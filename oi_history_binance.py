@@ -0,0 +1,199 @@
+import os
+import struct
+import time
+
+import numpy as np
+import requests
+
+# --- 配置区域 ---
+period = '1h'
+period_ms = 60 * 60 * 1000
+retention_days = 29           # Binance 只保留约 30 天的 OI 历史，留一天余量
+page_limit = 500              # openInterestHist 单次最多 500 条
+store_dir = 'data/oi_history/{}'.format(period)
+
+exchange_info_url = "https://fapi.binance.com/fapi/v1/exchangeInfo"
+oi_hist_url = "https://fapi.binance.com/futures/data/openInterestHist"
+
+# 每条记录定长 24 字节: 时间戳(ms), 持仓量, 持仓价值(USDT)
+record_format = '<qdd'
+record_size = struct.calcsize(record_format)
+record_dtype = np.dtype([('timestamp', '<i8'), ('oi', '<f8'), ('value', '<f8')])
+
+# 最新记录超过两个周期未更新视为过期；窗口起点与目标时间最多相差一个周期
+max_staleness_ms = 2 * period_ms
+max_base_gap_ms = period_ms
+
+change_windows = {
+    '4h': 4 * period_ms,
+    '24h': 24 * period_ms,
+    '7d': 7 * 24 * period_ms,
+    '30d': 30 * 24 * period_ms,
+}
+
+
+def store_path(symbol):
+    return os.path.join(store_dir, f'{symbol}.bin')
+
+
+def last_timestamp(symbol):
+    """只读文件末尾的一条完整记录，不加载整个文件"""
+    path = store_path(symbol)
+    if not os.path.exists(path):
+        return None
+    size = os.path.getsize(path)
+    size -= size % record_size  # 忽略写了一半的尾部
+    if size == 0:
+        return None
+    with open(path, 'rb') as f:
+        f.seek(size - record_size)
+        return struct.unpack(record_format, f.read(record_size))[0]
+
+
+def append_records(symbol, rows, after_ts=None):
+    """把接口返回的行按时间顺序追加到文件，只写入晚于 after_ts 的记录"""
+    os.makedirs(store_dir, exist_ok=True)
+    path = store_path(symbol)
+    # 上次写入中断留下的半条记录先截掉，保证追加后仍然按记录对齐
+    if os.path.exists(path) and os.path.getsize(path) % record_size:
+        os.truncate(path, os.path.getsize(path) - os.path.getsize(path) % record_size)
+    written = 0
+    with open(path, 'ab') as f:
+        for row in sorted(rows, key=lambda r: int(r['timestamp'])):
+            ts = int(row['timestamp'])
+            if after_ts is not None and ts <= after_ts:
+                continue
+            f.write(struct.pack(record_format, ts, float(row['sumOpenInterest']), float(row['sumOpenInterestValue'])))
+            after_ts = ts
+            written += 1
+    return written
+
+
+def load_history(symbol, start_ts=None, end_ts=None):
+    """读取 [start_ts, end_ts] 范围内的记录，返回按时间升序的结构化数组"""
+    path = store_path(symbol)
+    if not os.path.exists(path):
+        return np.empty(0, dtype=record_dtype)
+    count = os.path.getsize(path) // record_size
+    if count == 0:
+        return np.empty(0, dtype=record_dtype)
+    # 内存映射只按需读取页面，二分定位后只复制所需区间
+    data = np.memmap(path, dtype=record_dtype, mode='r', shape=(count,))
+    lo = 0 if start_ts is None else np.searchsorted(data['timestamp'], start_ts, side='left')
+    hi = count if end_ts is None else np.searchsorted(data['timestamp'], end_ts, side='right')
+    result = np.array(data[lo:hi])
+    del data
+    return result
+
+
+def oi_changes(symbol, windows=change_windows, now_ms=None):
+    """
+    以最新一条记录为基准，计算各窗口的持仓价值变化 (%)。
+    窗口起点取不晚于 (最新时间 - 窗口) 的最近一条记录，且与目标时间相差不超过一个周期；
+    历史不够长、起点落在缺口里或最新记录已过期时为 None。
+    """
+    result = {label: None for label in windows}
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+    last_ts = last_timestamp(symbol)
+    if last_ts is None or now_ms - last_ts > max_staleness_ms:
+        return result
+    # 只读取最长窗口再多一个周期的数据，文件再大也不用整体加载
+    data = load_history(symbol, start_ts=last_ts - max(windows.values()) - max_base_gap_ms)
+    if len(data) == 0:
+        return result
+    ts = data['timestamp']
+    last = data['value'][-1]
+    for label, window_ms in windows.items():
+        target = ts[-1] - window_ms
+        idx = np.searchsorted(ts, target, side='right') - 1
+        if idx >= 0 and target - ts[idx] <= max_base_gap_ms and data['value'][idx]:
+            result[label] = float((last - data['value'][idx]) / data['value'][idx] * 100)
+    return result
+
+
+def fetch_perpetual_symbols():
+    info = requests.get(exchange_info_url, timeout=10).json()
+    return [s['symbol'] for s in info['symbols']
+            if s.get('contractType') == 'PERPETUAL' and s.get('status') == 'TRADING']
+
+
+def update_symbol(symbol, now_ms):
+    """
+    增量拉取单个合约的 OI 历史。
+    已有数据时只请求缺少的周期数 (通常 limit=1)，否则从保留期起点开始分页回补。
+    """
+    last_ts = last_timestamp(symbol)
+    earliest = now_ms - retention_days * 24 * period_ms
+    start_ts = max(last_ts + period_ms, earliest) if last_ts is not None else earliest
+    written = 0
+
+    while start_ts <= now_ms:
+        limit = int(min(page_limit, (now_ms - start_ts) // period_ms + 1))
+        params = {
+            'symbol': symbol,
+            'period': period,
+            'limit': limit,
+            'startTime': start_ts,
+            'endTime': start_ts + (limit - 1) * period_ms,
+        }
+        response = requests.get(oi_hist_url, params=params, timeout=5)
+        if response.status_code != 200:
+            break
+        rows = response.json()
+        if not rows:
+            break
+        n = append_records(symbol, rows, after_ts=last_ts)
+        if n == 0:
+            break
+        written += n
+        last_ts = last_timestamp(symbol)
+        if len(rows) < limit:
+            break
+        start_ts = last_ts + period_ms
+        time.sleep(0.35)
+    return written
+
+
+def collect_oi_history(symbols=None):
+    if symbols is None:
+        symbols = fetch_perpetual_symbols()
+    now_ms = int(time.time() * 1000)
+    # 对齐到最近一个整点周期
+    now_ms -= now_ms % period_ms
+
+    total = 0
+    requested = 0
+    for symbol in symbols:
+        last_ts = last_timestamp(symbol)
+        if last_ts is not None and last_ts >= now_ms:
+            continue
+        try:
+            total += update_symbol(symbol, now_ms)
+        except Exception as e:
+            print(f"[{symbol}] 出错: {e}")
+        requested += 1
+        time.sleep(0.35)
+    print(f"OI 历史更新完成: 请求 {requested}/{len(symbols)} 个合约，新增 {total} 条记录")
+    return total
+
+
+if __name__ == "__main__":
+    symbols = fetch_perpetual_symbols()
+    print(f"共 {len(symbols)} 个永续合约，开始增量更新 OI 历史 ({period})...")
+    print("-" * 70)
+    collect_oi_history(symbols)
+
+    changes = []
+    for symbol in symbols:
+        c = oi_changes(symbol)
+        if c['24h'] is not None:
+            changes.append((symbol, c))
+    changes.sort(key=lambda x: x[1]['24h'], reverse=True)
+
+    print("\n" + "=" * 40)
+    print("【24H 持仓价值增幅最大的 10 个合约】")
+    for symbol, c in changes[:10]:
+        parts = ' | '.join(f"{k}: {v:+.2f}%" if v is not None else f"{k}: -" for k, v in c.items())
+        print(f"{symbol:<16} {parts}")
+    print("=" * 40 + "\n")
@@ -0,0 +1,352 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from drawdown_analysis_binance import exclude_symbols
+from oi_history_binance import collect_oi_history, oi_changes
+
+# --- 配置区域 ---
+host = '127.0.0.1'
+port = 8765
+refresh_seconds = 60             # 行情 (三个 ticker 接口) 刷新间隔
+detail_refresh_seconds = 300     # 前 N 名详情 (K 线 / OI) 刷新间隔
+oi_collect_seconds = 300         # OI 历史增量采集间隔，没有新周期的合约不发请求
+detail_top_n = 100
+# 详情超过两个刷新周期未更新 (一轮详情刷新本身需要一两分钟) 视为过期
+detail_max_age_ms = 2 * detail_refresh_seconds * 1000
+delist_grace_ms = 30 * 60 * 1000 # closeTime 早于 30 分钟前视为已下架
+default_page_size = 100
+max_page_size = 500
+
+spot_ticker_url = "https://api.binance.com/api/v3/ticker/24hr"
+fut_ticker_url = "https://fapi.binance.com/fapi/v1/ticker/24hr"
+premium_url = "https://fapi.binance.com/fapi/v1/premiumIndex"
+fut_klines_url = "https://fapi.binance.com/fapi/v1/klines"
+oi_url = "https://fapi.binance.com/fapi/v1/openInterest"
+oi_hist_url = "https://fapi.binance.com/futures/data/openInterestHist"
+
+# 与回撤分析共用同一份稳定币 / 包装币排除列表
+exclude_bases = {s.upper() for s in exclude_symbols}
+
+detail_fields = ['spotChg1h', 'spotChg4h', 'spotChg3d', 'spotChg7d',
+                 'oiValue', 'oiChg4h', 'oiChg24h', 'oiChg7d', 'oiChg30d']
+sortable_fields = {
+    'symbol', 'base', 'spotPrice', 'spotChg24h', 'spotVol', 'futVol', 'totalVol', 'fundingRate',
+    'originalRank', *detail_fields,
+}
+
+
+def is_eligible(symbol):
+    """USDT 本位且不在排除列表中的合约"""
+    return symbol.endswith('USDT') and symbol[:-4] not in exclude_bases
+
+
+def pct_change(cur, prev):
+    return (cur - prev) / prev * 100 if prev else None
+
+
+def get_fut_klines(symbol):
+    """1H / 4H 涨跌幅"""
+    r = requests.get(fut_klines_url, params={'symbol': symbol, 'interval': '1h', 'limit': 5}, timeout=5)
+    data = r.json() if r.status_code == 200 else []
+    if len(data) < 2:
+        return {}
+    cur = float(data[-1][4])
+    p1h = float(data[-2][4])
+    p4h = float(data[-5][4]) if len(data) >= 5 else p1h
+    return {'spotChg1h': pct_change(cur, p1h), 'spotChg4h': pct_change(cur, p4h)}
+
+
+def get_fut_daily_klines(symbol):
+    """3D / 7D 涨跌幅，最后一根是当天未收盘的 K 线"""
+    r = requests.get(fut_klines_url, params={'symbol': symbol, 'interval': '1d', 'limit': 8}, timeout=5)
+    data = r.json() if r.status_code == 200 else []
+    if len(data) < 2:
+        return {}
+    cur = float(data[-1][4])
+    details = {}
+    if len(data) >= 4:
+        details['spotChg3d'] = pct_change(cur, float(data[-4][4]))
+    if len(data) >= 8:
+        details['spotChg7d'] = pct_change(cur, float(data[-8][4]))
+    return details
+
+
+def get_fut_oi_stats(symbol, ref_price):
+    """当前持仓价值以及持仓变化，变化优先从本地 OI 历史计算"""
+    details = {}
+    r = requests.get(oi_url, params={'symbol': symbol}, timeout=5)
+    data = r.json() if r.status_code == 200 else {}
+    if data.get('openInterest'):
+        details['oiValue'] = float(data['openInterest']) * ref_price
+
+    # 本地历史过期时 oi_changes 全部返回 None，自然走下面的直连兜底
+    changes = oi_changes(symbol)
+    if changes['4h'] is not None and changes['24h'] is not None:
+        details.update({
+            'oiChg4h': changes['4h'],
+            'oiChg24h': changes['24h'],
+            'oiChg7d': changes['7d'],
+            'oiChg30d': changes['30d'],
+        })
+        return details
+
+    # 本地历史缺失、过期或近 24 小时有缺口，退回直接请求最近 25 小时
+    r = requests.get(oi_hist_url, params={'symbol': symbol, 'period': '1h', 'limit': 25}, timeout=5)
+    hist = r.json() if r.status_code == 200 else []
+    if isinstance(hist, list) and hist:
+        last = float(hist[-1]['sumOpenInterestValue'])
+        if len(hist) >= 5:
+            details['oiChg4h'] = pct_change(last, float(hist[-5]['sumOpenInterestValue']))
+        if len(hist) >= 24:
+            details['oiChg24h'] = pct_change(last, float(hist[0]['sumOpenInterestValue']))
+    return details
+
+
+class UniverseRanker:
+    """
+    维护可交易的合约标的池 (按期货成交额排名)。
+    每次刷新只替换行情字段，已获取的详情字段保留到下一轮详情刷新，
+    详情过期或标的跌出前 N 名时清空，交给客户端自行请求；
+    发布出去的行和排名列表都不再修改，读请求无需加锁即可安全序列化。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._eligible = {}
+        self._sorted_cache = {}
+        self.ranked = []
+        self.version = 0
+        self.updated_at = None
+
+    def refresh(self):
+        spot_data = requests.get(spot_ticker_url, timeout=10).json()
+        fut_data = requests.get(fut_ticker_url, timeout=10).json()
+        prem_data = requests.get(premium_url, timeout=10).json()
+        self.apply_tickers(spot_data, fut_data, prem_data, int(time.time() * 1000))
+
+    def apply_tickers(self, spot_data, fut_data, prem_data, now_ms):
+        # 过滤掉前一日收盘价为 0 的无效现货数据
+        spot_map = {d['symbol']: d for d in spot_data
+                    if d['symbol'].endswith('USDT') and float(d['prevClosePrice']) > 0}
+        prem_map = {d['symbol']: d for d in prem_data}
+        cutoff = now_ms - delist_grace_ms
+
+        with self._lock:
+            rows = {}
+            for f in fut_data:
+                symbol = f['symbol']
+                eligible = self._eligible.get(symbol)
+                if eligible is None:
+                    eligible = self._eligible[symbol] = is_eligible(symbol)
+                if not eligible:
+                    continue
+                if f.get('closeTime') and f['closeTime'] < cutoff:
+                    continue
+
+                s = spot_map.get(symbol)
+                p = prem_map.get(symbol)
+                s_vol = float(s['quoteVolume']) if s else 0.0
+                f_vol = float(f['quoteVolume'])
+                row = {
+                    'symbol': symbol,
+                    'base': symbol[:-4],
+                    # 价格和涨跌幅优先使用现货，没有现货则使用期货
+                    'spotPrice': float((s or f)['lastPrice']),
+                    'spotChg24h': float((s or f)['priceChangePercent']),
+                    'spotVol': s_vol,
+                    'futVol': f_vol,
+                    'totalVol': s_vol + f_vol,
+                    # 年化 = 资金费率 * 3 (8小时一次) * 365
+                    'fundingRate': float(p['lastFundingRate']) * 100 * 3 * 365 if p else None,
+                    'fundingAPY': None,
+                    'enriched': False,
+                    'detailsAt': None,
+                }
+                old = self._rows.get(symbol)
+                for k in detail_fields:
+                    row[k] = old[k] if old else None
+                if old:
+                    row['enriched'] = old['enriched']
+                    row['detailsAt'] = old['detailsAt']
+                rows[symbol] = row
+
+            self._rows = rows
+            # updatedAt 只反映行情的时间，详情更新不应让断线后的旧价格看起来是新的
+            self.updated_at = now_ms
+            self._publish()
+
+    def update_details(self, details_by_symbol):
+        """details_by_symbol: {symbol: (details, ok)}，只有全部详情请求成功才标记为 enriched"""
+        now_ms = int(time.time() * 1000)
+        with self._lock:
+            for symbol, (details, ok) in details_by_symbol.items():
+                if symbol in self._rows:
+                    # 先清空旧详情，本轮没有返回的字段不能顶着新的 detailsAt 继续展示
+                    self._rows[symbol] = {**self._rows[symbol], **dict.fromkeys(detail_fields), **details,
+                                          'enriched': ok, 'detailsAt': now_ms}
+            self._publish()
+
+    def _publish(self):
+        """重新排名并发布新的快照 (调用方持有锁)"""
+        now_ms = int(time.time() * 1000)
+        ranked = []
+        for i, r in enumerate(sorted(self._rows.values(), key=lambda r: r['futVol'], reverse=True)):
+            row = {**r, 'originalRank': i + 1}
+            if row['detailsAt'] is not None and (i >= detail_top_n or now_ms - row['detailsAt'] > detail_max_age_ms):
+                row.update({k: None for k in detail_fields})
+                row.update({'enriched': False, 'detailsAt': None})
+            ranked.append(row)
+        self._rows = {r['symbol']: r for r in ranked}
+        self.ranked = ranked
+        self.version += 1
+        self._sorted_cache = {}
+
+    def top_symbols(self, n):
+        return [(r['symbol'], r['spotPrice']) for r in self.ranked[:n]]
+
+    def page(self, sort=None, top=None, page=1, size=default_page_size):
+        """
+        返回分页后的结果。
+        top: 先按成交额截取前 N 名 (与看板的 limit 一致)，再排序分页。
+        sort: 逗号分隔的字段，前缀 '-' 表示降序，例如 '-fundingRate,-futVol'。
+        """
+        keys = [k.strip() for k in (sort or '').split(',') if k.strip()]
+        for k in keys:
+            if k.lstrip('-') not in sortable_fields:
+                raise ValueError(f"不支持的排序字段: {k}")
+        if not 1 <= size <= max_page_size:
+            raise ValueError(f"size 必须在 1 到 {max_page_size} 之间")
+        if page < 1:
+            raise ValueError("page 必须从 1 开始")
+        if top is not None and top < 1:
+            raise ValueError("top 必须大于 0")
+
+        with self._lock:
+            ranked, version, updated_at = self.ranked, self.version, self.updated_at
+            cache_key = (version, top, tuple(keys))
+            view = self._sorted_cache.get(cache_key)
+
+        if view is None:
+            view = ranked[:top] if top is not None else ranked
+            # 多字段排序：从最后一个字段开始做稳定排序，空值始终排在最后
+            for k in reversed(keys):
+                desc = k.startswith('-')
+                field = k.lstrip('-')
+                present = [r for r in view if r.get(field) is not None]
+                missing = [r for r in view if r.get(field) is None]
+                present.sort(key=lambda r: r[field], reverse=desc)
+                view = present + missing
+            with self._lock:
+                if self.version == version:
+                    self._sorted_cache[cache_key] = view
+
+        start = (page - 1) * size
+        return {
+            'version': version,
+            'updatedAt': updated_at,
+            'total': len(view),
+            'page': page,
+            'size': size,
+            'rows': view[start:start + size],
+            # 看板直连 Binance 兜底时复用同一份排除列表
+            'excludeBases': sorted(exclude_bases),
+        }
+
+
+def enrich_top(ranker, n=detail_top_n):
+    """为前 N 名预取详情，每 10 个发布一次，客户端无需再逐个请求"""
+    batch = {}
+    for symbol, price in ranker.top_symbols(n):
+        details = {}
+        ok = True
+        for fetch, args in ((get_fut_klines, (symbol,)),
+                            (get_fut_daily_klines, (symbol,)),
+                            (get_fut_oi_stats, (symbol, price))):
+            try:
+                result = fetch(*args)
+            except Exception as e:
+                print(f"[{symbol}] 详情获取出错 ({fetch.__name__}): {e}")
+                result = {}
+            # 返回空结果说明请求失败或被限频，不能让客户端跳过该标的
+            ok = ok and bool(result)
+            if fetch is get_fut_oi_stats:
+                # 只拿到当前持仓、历史变化都失败时同样算失败
+                ok = ok and result.get('oiChg4h') is not None and result.get('oiChg24h') is not None
+            details.update(result)
+        batch[symbol] = (details, ok)
+        if len(batch) >= 10:
+            ranker.update_details(batch)
+            batch = {}
+        time.sleep(0.1)
+    if batch:
+        ranker.update_details(batch)
+
+
+def run_periodically(func, interval_seconds, initial_delay=0):
+    def loop():
+        time.sleep(initial_delay)
+        while True:
+            start = time.time()
+            try:
+                func()
+            except Exception as e:
+                print(f"后台任务 {func.__name__} 出错: {e}")
+            time.sleep(max(0, interval_seconds - (time.time() - start)))
+    threading.Thread(target=loop, daemon=True).start()
+
+
+def make_handler(ranker):
+    class UniverseHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != '/universe':
+                self._send_json(404, {'error': 'not found'})
+                return
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                top = int(query['top']) if 'top' in query else None
+                result = ranker.page(
+                    sort=query.get('sort'),
+                    top=top,
+                    page=int(query.get('page', 1)),
+                    size=int(query.get('size', default_page_size)),
+                )
+            except ValueError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            self._send_json(200, result)
+
+    return UniverseHandler
+
+
+def serve_universe():
+    ranker = UniverseRanker()
+    ranker.refresh()
+    print(f"标的池初始化完成，共 {len(ranker.ranked)} 个合约")
+
+    run_periodically(ranker.refresh, refresh_seconds, initial_delay=refresh_seconds)
+    run_periodically(collect_oi_history, oi_collect_seconds)
+    run_periodically(lambda: enrich_top(ranker), detail_refresh_seconds)
+
+    server = ThreadingHTTPServer((host, port), make_handler(ranker))
+    print(f"服务已启动: http://{host}:{port}/universe?top={detail_top_n}&sort=-futVol&page=1&size=50")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    serve_universe()